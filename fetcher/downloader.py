@@ -2,17 +2,21 @@
 """
 Real File Downloader - Maximum Speed Optimizations
 """
-import urllib.request
 import urllib.parse
 import sys
 import os
 import json
 import re
 import time
-import socket
 import threading
+import zlib
+import contextlib
+import http.client
+from functools import lru_cache
 from urllib.error import URLError, HTTPError
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import http_pool
 
 # Import platform URLs from fetcher.py to maintain single source of truth
 try:
@@ -21,105 +25,156 @@ except ImportError:
     # Fallback in case fetcher.py is not available
     PLATFORM_URLS = {}
 
+READ_BUFFER_SIZE = 1024 * 1024  # 1MB socket reads, written straight to disk
+WINDOW_SIZE = 4 * 1024 * 1024  # Parallel downloads fetch the file in 4MB range requests
+MAX_WINDOW_ATTEMPTS = 3
+MAX_CONNECTIONS = 6
+MIN_BYTES_PER_CONNECTION = 8 * 1024 * 1024
+COMPRESSED_EXTENSIONS = ('.zip', '.7z', '.gz', '.png')  # .p8.png carts included
+PART_SUFFIX = '.part'  # Windows are written here, the ROM only gets its real name once complete
+PROGRESS_SUFFIX = '.progress'  # Sidecar next to the .part file listing its finished windows
+
+PROGRESS_FILE = "/tmp/file_download_progress.json"
+# Same layout json.dump produces, the UI matches on '"key": value'
+PROGRESS_FORMAT = '{{"status": "downloading", "percent": {}, "downloaded_mb": {:.1f}, "total_mb": {:.1f}}}'
+_progress_fd = None
+_progress_size = 0
+
+UNSAFE_FILENAME_CHARS = re.compile(r'[<>:"/\|?*]')
+CONTROL_CHARS = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+
+@lru_cache(maxsize=None)
 def get_platform_folder(platform_name):
-    """Get platform folder from get_platforms.py output"""
+    """Get platform folder from get_platforms.py"""
     try:
-        import subprocess
-        result = subprocess.run(['python3', 'get_platforms.py'], 
-                              capture_output=True, text=True, cwd=os.path.dirname(__file__))
-        
-        if result.returncode == 0:
-            import json
-            data = json.loads(result.stdout)
-            for platform in data.get('platforms', []):
-                if platform['name'] == platform_name:
-                    return platform['folder']
+        import get_platforms
+        data = get_platforms.get_platform_list()
+        for platform in data.get('platforms', []):
+            if platform['name'] == platform_name:
+                return platform['folder']
     except Exception as e:
         print(f"Error getting platform folder: {e}", file=sys.stderr)
     
-    
-    return fallback_folders.get(platform_name, platform_name.lower().replace(" ", ""))
+    return platform_name.lower().replace(" ", "")
 
+@lru_cache(maxsize=1024)
 def clean_filename(filename):
     """Clean filename for filesystem compatibility"""
     # Remove or replace problematic characters
-    cleaned = re.sub(r'[<>:"/\|?*]', '_', filename)
+    cleaned = UNSAFE_FILENAME_CHARS.sub('_', filename)
     # Remove control characters
-    cleaned = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', cleaned)
+    cleaned = CONTROL_CHARS.sub('', cleaned)
     # Limit length
     if len(cleaned) > 200:
         name, ext = os.path.splitext(cleaned)
         cleaned = name[:196] + ext
     return cleaned
 
-def setup_socket_optimizations():
-    """Configure socket optimizations for faster downloads"""
-    # Set default socket timeout
-    socket.setdefaulttimeout(60)
-    
-    # Configure TCP socket options for better performance
-    original_socket = socket.socket
-    
-    def optimized_socket(*args, **kwargs):
-        sock = original_socket(*args, **kwargs)
-        try:
-            # Enable TCP_NODELAY to disable Nagle's algorithm (reduces latency)
-            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-            # Set larger socket buffer sizes
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)  # 1MB receive buffer
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)  # 1MB send buffer
-        except (OSError, AttributeError):
-            pass  # Some systems may not support these options
-        return sock
+def raw_url_builder(base_url):
+    """
+    Work out once how a platform URL maps to download URLs.
+    Returns a function (file_filename, encoded_filename) -> file URL.
+    """
+    # Handle GitHub repositories specially
+    if 'github.com' in base_url:
+        if '/tree/' in base_url:
+            # GitHub folder/tree URL
+            # From: https://github.com/user/repo/tree/main/pico-8
+            # To: https://raw.githubusercontent.com/user/repo/main/pico-8/
+            raw_base = base_url.replace('github.com', 'raw.githubusercontent.com')
+            raw_base = raw_base.replace('/tree/', '/')
+            if not raw_base.endswith('/'):
+                raw_base += '/'
+            # file_filename contains full path like "pico-8/romnix.p8.png"
+            # Extract just the filename for the URL
+            return lambda file_filename, encoded_filename: raw_base + file_filename.split('/')[-1]
+        elif '/blob/' in base_url:
+            # GitHub blob URL - single file
+            # From: https://github.com/user/repo/blob/main/pico-8/file.png
+            # To: https://raw.githubusercontent.com/user/repo/main/pico-8/file.png
+            raw_base = base_url.replace('github.com', 'raw.githubusercontent.com')
+            raw_base = raw_base.replace('/blob/', '/')
+            return lambda file_filename, encoded_filename: raw_base
+        else:
+            # Regular GitHub repo URL
+            raw_base = base_url.replace('github.com', 'raw.githubusercontent.com')
+            if not raw_base.endswith('/'):
+                raw_base += '/'
+            if '/main/' not in raw_base and '/master/' not in raw_base:
+                raw_base += 'main/'
+            return lambda file_filename, encoded_filename: raw_base + encoded_filename
     
-    socket.socket = optimized_socket
+    # For Myrient and other direct download sites
+    if not base_url.endswith('/'):
+        base_url += '/'
+    return lambda file_filename, encoded_filename: base_url + encoded_filename
+
+RAW_URL_BUILDERS = {name: raw_url_builder(url) for name, url in PLATFORM_URLS.items()}
 
-def parallel_chunk_download(url, start_byte, end_byte, chunk_id):
-    """Download a specific byte range of a file"""
+def parallel_chunk_download(url, start_byte, end_byte, chunk_id, fd):
+    """Download a specific byte range of a file straight to its offset in fd"""
     try:
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', 'File Downloader/1.0 (Parallel)')
-        req.add_header('Accept-Encoding', 'gzip, deflate')
-        req.add_header('Connection', 'keep-alive')
-        req.add_header('Range', f'bytes={start_byte}-{end_byte}')
+        response = http_pool.request('GET', url, headers={
+            'User-Agent': 'File Downloader/1.0 (Parallel)',
+            'Range': f'bytes={start_byte}-{end_byte}'  # No Accept-Encoding: offsets must be raw bytes
+        }, timeout=45)
+        try:
+            if response.status != 206:
+                raise OSError(f"Server ignored range request (HTTP {response.status})")
+            
+            # Reuse one buffer for the whole range instead of a new bytes object per read
+            buffer = memoryview(bytearray(READ_BUFFER_SIZE))
+            offset = start_byte
+            while True:
+                n = response.readinto(buffer)
+                if not n:
+                    break
+                os.pwrite(fd, buffer[:n], offset)
+                offset += n
+        finally:
+            http_pool.release(response)
         
-        response = urllib.request.urlopen(req, timeout=45)
-        data = response.read()
+        if offset != end_byte + 1:
+            raise OSError(f"Connection closed after {offset - start_byte} bytes")
         
-        return chunk_id, start_byte, data
+        return chunk_id, start_byte, offset - start_byte
         
     except Exception as e:
         print(f"Chunk {chunk_id} download failed: {e}", file=sys.stderr)
         return chunk_id, start_byte, None
 
-def test_server_supports_ranges(url):
-    """Test if server supports HTTP range requests for parallel downloads"""
+def probe_file(url, user_agent, timeout):
+    """
+    Get the file size and range support with a single one-byte range request.
+    A 206 answer carries the full size in Content-Range and proves ranges work.
+    An empty file can't satisfy the range and answers 416 with "bytes */0".
+    Returns (total_size, supports_ranges).
+    """
     try:
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', 'File Downloader/1.0 (Range Test)')
-        req.add_header('Range', 'bytes=0-1023')  # Request first 1KB
-        
-        response = urllib.request.urlopen(req, timeout=10)
-        return response.status == 206  # Partial Content
-    except:
-        return False
+        response = http_pool.request('GET', url, headers={
+            'User-Agent': user_agent,
+            'Range': 'bytes=0-0'
+        }, timeout=timeout)
+    except HTTPError as e:
+        if e.code != 416:
+            raise
+        # Report it without range support so the single-threaded path writes the file
+        total = (e.headers or {}).get('Content-Range', '').rsplit('/', 1)[-1]
+        return (int(total) if total.isdigit() else 0), False
+    http_pool.release(response)
+    
+    if response.status == 206:
+        total = response.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+        return (int(total) if total.isdigit() else 0), True
+    return int(response.headers.get('Content-Length', 0)), False
 
 def optimized_download_with_progress(url, target_file, progress_callback=None):
     """
     Maximum speed download with parallel chunks and optimizations
     """
-    setup_socket_optimizations()
-    
     # First, get file size and test for range support
-    req = urllib.request.Request(url)
-    req.add_header('User-Agent', 'File Downloader/1.0 (Speed Optimized)')
-    req.add_header('Accept-Encoding', 'gzip, deflate')
-    req.add_header('Connection', 'keep-alive')
-    
     try:
-        response = urllib.request.urlopen(req, timeout=30)
-        total_size = int(response.headers.get('Content-Length', 0))
-        response.close()
+        total_size, supports_ranges = probe_file(url, 'File Downloader/1.0 (Speed Optimized)', 30)
         
         # Immediately show file size info
         if progress_callback and total_size > 0:
@@ -128,48 +183,72 @@ def optimized_download_with_progress(url, target_file, progress_callback=None):
         print(f"File size: {total_size / (1024*1024):.1f} MB", file=sys.stderr)
         
         # For small files or servers that don't support ranges, use single-threaded download
-        if total_size < 5 * 1024 * 1024 or not test_server_supports_ranges(url):  # < 5MB
+        num_threads = connections_for_size(total_size)
+        if num_threads == 1 or not supports_ranges:  # < 16MB
             print("Using single-threaded download", file=sys.stderr)
             return single_threaded_download(url, target_file, progress_callback, total_size)
         
         # Use parallel download for larger files
-        print("Using parallel download (4 threads)", file=sys.stderr)
-        return parallel_download(url, target_file, progress_callback, total_size)
+        print(f"Using parallel download ({num_threads} threads)", file=sys.stderr)
+        return parallel_download(url, target_file, progress_callback, total_size, num_threads)
         
-    except (URLError, HTTPError, OSError) as e:
+    except (URLError, HTTPError, OSError, http.client.HTTPException) as e:
         print(f"Download error: {e}", file=sys.stderr)
         return False
 
 def single_threaded_download(url, target_file, progress_callback, total_size):
     """Optimized single-threaded download"""
-    req = urllib.request.Request(url)
-    req.add_header('User-Agent', 'File Downloader/1.0 (Single Thread)')
-    req.add_header('Accept-Encoding', 'gzip, deflate')
-    req.add_header('Connection', 'keep-alive')
+    headers = {'User-Agent': 'File Downloader/1.0 (Single Thread)'}
+    # Archives and PNG carts don't shrink, compressing them again only costs CPU
+    if not urllib.parse.urlsplit(url).path.lower().endswith(COMPRESSED_EXTENSIONS):
+        headers['Accept-Encoding'] = 'gzip, deflate'
     
     try:
-        response = urllib.request.urlopen(req, timeout=60)
+        response = http_pool.request('GET', url, headers=headers, timeout=60)
         
-        # Use very large buffer for single-threaded downloads
-        buffer_size = 2 * 1024 * 1024  # 2MB chunks
-        downloaded = 0
-        last_progress_update = 0
-        progress_update_interval = 0.2
+        decoder = None
+        if response.headers.get('Content-Encoding', '').lower() in ('gzip', 'deflate'):
+            decoder = zlib.decompressobj(zlib.MAX_WBITS | 32)  # Accepts gzip and zlib headers
         
-        with open(target_file, 'wb') as f:
-            while True:
-                chunk = response.read(buffer_size)
-                if not chunk:
-                    break
-                
-                f.write(chunk)
-                downloaded += len(chunk)
+        try:
+            # Writing the whole file makes any .part left by a parallel attempt useless
+            clear_window_state(target_file)
+            
+            # Use very large buffer for single-threaded downloads, allocated once and refilled
+            buffer_size = 2 * 1024 * 1024  # 2MB chunks
+            buffer = memoryview(bytearray(buffer_size))
+            downloaded = 0
+            last_progress_update = 0
+            progress_update_interval = 0.2
+            
+            with open(target_file, 'wb') as f:
+                advise_sequential(f.fileno())
+                while True:
+                    n = response.readinto(buffer)
+                    if not n:
+                        break
+                    
+                    data = decoder.decompress(buffer[:n]) if decoder else buffer[:n]
+                    f.write(data)
+                    downloaded += len(data)
+                    
+                    # Update progress
+                    current_time = time.time()
+                    if progress_callback and (current_time - last_progress_update) >= progress_update_interval:
+                        progress_callback(downloaded, total_size)
+                        last_progress_update = current_time
                 
-                # Update progress
-                current_time = time.time()
-                if progress_callback and (current_time - last_progress_update) >= progress_update_interval:
-                    progress_callback(downloaded, total_size)
-                    last_progress_update = current_time
+                if decoder:
+                    f.write(decoder.flush())
+                f.flush()
+                drop_page_cache(f.fileno())
+            
+            # readinto() returns 0 when the server hangs up early, bytes still owed means a cut-off file
+            if response.length:
+                raise OSError(f"Connection closed with {response.length} bytes missing")
+        finally:
+            # Drained responses go back to the pool, a failed one has its socket closed
+            http_pool.release(response)
         
         # Final progress update
         if progress_callback:
@@ -181,228 +260,351 @@ def single_threaded_download(url, target_file, progress_callback, total_size):
         print(f"Single-threaded download error: {e}", file=sys.stderr)
         return False
 
-def parallel_download(url, target_file, progress_callback, total_size):
-    """Parallel multi-threaded download"""
-    num_threads = 4
-    chunk_size = total_size // num_threads
+def connections_for_size(total_size, max_connections=MAX_CONNECTIONS):
+    """
+    One connection per 8MB of file, capped at max_connections.
+    A connection that only moves a MB or two finishes while TCP slow start
+    is still opening its window (the bandwidth-delay product of a fast link
+    is several MB), so splitting smaller files just adds handshakes.
+    """
+    return max(1, min(max_connections, total_size // MIN_BYTES_PER_CONNECTION))
+
+def split_windows(total_size, window_size=WINDOW_SIZE):
+    """Split a file into fixed-size (start_byte, end_byte) ranges"""
+    return [(start, min(start + window_size, total_size) - 1)
+            for start in range(0, total_size, window_size)]
+
+def advise_sequential(fd):
+    """Hint that the file is written front to back, where posix_fadvise exists"""
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+def drop_page_cache(fd):
+    """
+    Tell the kernel the downloaded file won't be read back soon. On a handheld
+    with 1-2GB of RAM this keeps a large ROM from pushing the UI's pages out of cache.
+    """
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+def open_window_file(target_file, url, total_size):
+    """
+    Open target_file's .part file for in-place window writes.
+    If a .progress sidecar from an interrupted download of the same URL and
+    size is present, the file is kept and the windows it lists are returned
+    as already completed; otherwise the file starts from scratch.
+    finish_window_file() moves it onto target_file once every window is in.
+    Returns (fd, completed_window_ids).
+    """
+    part_file = target_file + PART_SUFFIX
+    completed = set()
+    try:
+        with open(part_file + PROGRESS_SUFFIX, 'r') as f:
+            state = json.load(f)
+        if (state.get('url') == url and state.get('total_size') == total_size
+                and state.get('window_size') == WINDOW_SIZE
+                and os.path.getsize(part_file) == total_size):
+            completed = set(state.get('completed', []))
+    except (OSError, ValueError, TypeError):
+        pass
+    
+    flags = os.O_WRONLY | os.O_CREAT
+    if not completed:
+        flags |= os.O_TRUNC
+    fd = os.open(part_file, flags, 0o644)
+    try:
+        os.ftruncate(fd, total_size)
+    except OSError:
+        os.close(fd)
+        raise
+    advise_sequential(fd)
+    
+    if completed:
+        print(f"Resuming: {len(completed)} windows already on disk", file=sys.stderr)
+    return fd, completed
+
+def save_window_state(target_file, url, total_size, completed):
+    """Record completed windows so an interrupted download can resume"""
+    state = {
+        "url": url,
+        "total_size": total_size,
+        "window_size": WINDOW_SIZE,
+        "completed": sorted(completed)
+    }
+    state_file = target_file + PART_SUFFIX + PROGRESS_SUFFIX
+    try:
+        with open(state_file + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(state_file + '.tmp', state_file)
+    except OSError as e:
+        print(f"Resume state write error: {e}", file=sys.stderr)
+
+def finish_window_file(target_file):
+    """Give the completed .part file its real name and drop the resume sidecar"""
+    os.replace(target_file + PART_SUFFIX, target_file)
+    clear_window_state(target_file)
+
+def clear_window_state(target_file):
+    """Drop the partial file and its resume sidecar once complete or rewritten from scratch"""
+    for leftover in (target_file + PART_SUFFIX + PROGRESS_SUFFIX, target_file + PART_SUFFIX):
+        try:
+            os.remove(leftover)
+        except OSError:
+            pass
+
+def download_windows(worker, windows, num_workers, completed):
+    """
+    Run worker(window_id, start_byte, end_byte) over every window not in completed.
+    A failed window goes back in the queue after an exponential backoff and is
+    retried on whichever pooled connection picks it up next, so one slow or
+    broken connection never holds up the rest of the file. Finished windows
+    are added to completed and yielded as (window_id, bytes_written); OSError
+    is raised once a window runs out of attempts.
+    """
+    attempts = [0] * len(windows)
+    executor = ThreadPoolExecutor(max_workers=num_workers)
     
-    # Create download tasks
-    tasks = []
-    for i in range(num_threads):
-        start_byte = i * chunk_size
-        end_byte = start_byte + chunk_size - 1
-        if i == num_threads - 1:  # Last chunk gets remainder
-            end_byte = total_size - 1
-        tasks.append((start_byte, end_byte, i))
+    def run(window_id, delay):
+        if delay:
+            time.sleep(delay)
+        start_byte, end_byte = windows[window_id]
+        return worker(window_id, start_byte, end_byte)
     
-    print(f"Downloading {len(tasks)} parallel chunks", file=sys.stderr)
+    def submit(window_id):
+        delay = 2 ** (attempts[window_id] - 1) if attempts[window_id] else 0  # 1, 2 seconds
+        attempts[window_id] += 1
+        return executor.submit(run, window_id, delay)
     
-    # Download chunks in parallel
-    chunks = {}
-    downloaded = 0
+    try:
+        # Windows are written in place, so queueing all of them costs no extra memory
+        pending = {submit(window_id) for window_id in range(len(windows)) if window_id not in completed}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                window_id, start_byte, written = future.result()
+                if written is not None:
+                    completed.add(window_id)
+                    yield window_id, written
+                elif attempts[window_id] < MAX_WINDOW_ATTEMPTS:
+                    print(f"Window {window_id} failed, retrying", file=sys.stderr)
+                    pending.add(submit(window_id))
+                else:
+                    raise OSError(f"Window {window_id} failed after {attempts[window_id]} attempts")
+    finally:
+        # Workers must be finished with the file descriptor before the caller closes it,
+        # callers wrap this generator in closing() so this also runs when their loop raises
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def parallel_download(url, target_file, progress_callback, total_size, num_threads=MAX_CONNECTIONS):
+    """Parallel multi-threaded download, resumable per window"""
+    windows = split_windows(total_size)
+    
+    print(f"Downloading {len(windows)} windows over {num_threads} connections", file=sys.stderr)
+    
+    # Size the file up front so every window can be written at its own offset
+    try:
+        fd, completed = open_window_file(target_file, url, total_size)
+    except OSError as e:
+        print(f"Error creating {target_file}: {e}", file=sys.stderr)
+        return False
+    
+    def worker(window_id, start_byte, end_byte):
+        return parallel_chunk_download(url, start_byte, end_byte, window_id, fd)
+    
+    # Download windows in parallel
+    downloaded = sum(windows[i][1] - windows[i][0] + 1 for i in completed)
     last_progress_update = 0
     
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        # Submit all download tasks
-        future_to_chunk = {
-            executor.submit(parallel_chunk_download, url, start, end, chunk_id): chunk_id
-            for start, end, chunk_id in tasks
-        }
-        
-        # Collect results as they complete
-        for future in as_completed(future_to_chunk):
-            chunk_id, start_byte, data = future.result()
-            
-            if data is not None:
-                chunks[chunk_id] = (start_byte, data)
-                downloaded += len(data)
+    try:
+        # closing() stops the workers even when the loop body raises, before fd is closed
+        with contextlib.closing(download_windows(worker, windows, num_threads, completed)) as results:
+            for window_id, written in results:
+                downloaded += written
+                save_window_state(target_file, url, total_size, completed)
                 
                 # Update progress
                 current_time = time.time()
                 if progress_callback and (current_time - last_progress_update) >= 0.2:
                     progress_callback(downloaded, total_size)
                     last_progress_update = current_time
-                    
-                print(f"Chunk {chunk_id} completed ({len(data)} bytes)", file=sys.stderr)
-            else:
-                print(f"Chunk {chunk_id} failed, falling back to single-threaded", file=sys.stderr)
-                return single_threaded_download(url, target_file, progress_callback, total_size)
+    except OSError as e:
+        # Completed windows stay on disk, the next attempt only fetches the rest
+        print(f"Parallel download incomplete: {e}", file=sys.stderr)
+        return False
+    finally:
+        drop_page_cache(fd)
+        os.close(fd)
     
-    # Write chunks to file in correct order
     try:
-        with open(target_file, 'wb') as f:
-            for i in range(num_threads):
-                if i in chunks:
-                    start_byte, data = chunks[i]
-                    f.write(data)
-                else:
-                    print(f"Missing chunk {i}, download failed", file=sys.stderr)
-                    return False
-        
-        # Final progress update
-        if progress_callback:
-            progress_callback(total_size, total_size)
-            
-        print("Parallel download completed successfully", file=sys.stderr)
-        return True
-        
-    except Exception as e:
-        print(f"Error writing parallel chunks: {e}", file=sys.stderr)
+        finish_window_file(target_file)
+    except OSError as e:
+        print(f"Error moving {target_file} into place: {e}", file=sys.stderr)
         return False
+    
+    # Final progress update
+    if progress_callback:
+        progress_callback(total_size, total_size)
+        
+    print("Parallel download completed successfully", file=sys.stderr)
+    return True
 
 def accelerated_file_download(url, target_file):
     """
     Ultra-fast download using multiple simultaneous connections
     """
     class DownloadAccelerator:
-        def __init__(self, url, target_file, num_connections=6):
+        def __init__(self, url, target_file, num_connections=MAX_CONNECTIONS):
             self.url = url
             self.target_file = target_file
             self.num_connections = num_connections
             self.total_size = 0
-            self.downloaded = 0
-            self.chunks = {}
-            self.lock = threading.Lock()
+            # One slot per connection, only its own worker writes to it, so no lock is needed
+            self.counters = []
+            self.fd = None
+            self.stop_progress = threading.Event()
             
-        def get_file_size(self):
-            try:
-                req = urllib.request.Request(self.url)
-                req.add_header('User-Agent', 'File Accelerator/1.0')
-                response = urllib.request.urlopen(req, timeout=10)
-                self.total_size = int(response.headers.get('Content-Length', 0))
-                response.close()
-                return self.total_size > 0
-            except:
-                return False
-        
-        def test_range_support(self):
-            try:
-                req = urllib.request.Request(self.url)
-                req.add_header('User-Agent', 'File Accelerator/1.0')
-                req.add_header('Range', 'bytes=0-1023')
-                response = urllib.request.urlopen(req, timeout=10)
-                supports_ranges = response.status == 206
-                response.close()
-                return supports_ranges
-            except:
-                return False
-        
-        def download_chunk(self, connection_id, start_byte, end_byte):
+        def download_chunk(self, window_id, start_byte, end_byte):
+            self.counters[window_id] = 0  # A retried window starts over
             try:
-                req = urllib.request.Request(self.url)
-                req.add_header('User-Agent', f'File Accelerator/1.0 (Conn {connection_id})')
-                req.add_header('Accept-Encoding', 'gzip, deflate')
-                req.add_header('Connection', 'keep-alive')
+                # No Accept-Encoding: a compressed range would not line up with its file offset
+                headers = {'User-Agent': 'File Accelerator/1.0'}
                 
                 if start_byte is not None and end_byte is not None:
-                    req.add_header('Range', f'bytes={start_byte}-{end_byte}')
+                    headers['Range'] = f'bytes={start_byte}-{end_byte}'
                 
-                response = urllib.request.urlopen(req, timeout=45)
+                response = http_pool.request('GET', self.url, headers=headers, timeout=45)
+                if 'Range' in headers and response.status != 206:
+                    http_pool.release(response)
+                    raise OSError(f"Server ignored range request (HTTP {response.status})")
                 
-                data = b''
-                buffer_size = 128 * 1024  # 128KB buffer
+                offset = start_byte or 0
+                buffer = memoryview(bytearray(READ_BUFFER_SIZE))
                 
-                while True:
-                    chunk = response.read(buffer_size)
-                    if not chunk:
-                        break
-                    data += chunk
-                    
-                    with self.lock:
-                        self.downloaded += len(chunk)
-                        if self.downloaded % (256 * 1024) == 0:  # Every 256KB
-                            self.update_progress()
+                try:
+                    while True:
+                        n = response.readinto(buffer)
+                        if not n:
+                            break
+                        os.pwrite(self.fd, buffer[:n], offset)
+                        offset += n
+                        
+                        self.counters[window_id] += n
+                finally:
+                    http_pool.release(response)
                 
-                response.close()
-                return connection_id, start_byte, data
+                if end_byte is not None and offset != end_byte + 1:
+                    raise OSError(f"Connection closed after {offset - start_byte} bytes")
+                
+                return window_id, start_byte, offset - (start_byte or 0)
                 
             except Exception as e:
-                print(f"Connection {connection_id} error: {e}", file=sys.stderr)
-                return connection_id, start_byte, None
+                print(f"Window {window_id} error: {e}", file=sys.stderr)
+                return window_id, start_byte, None
         
         def update_progress(self):
-            if self.total_size > 0:
-                percent = min(100, (self.downloaded * 100) // self.total_size)
-                mb_downloaded = self.downloaded / (1024 * 1024)
-                mb_total = self.total_size / (1024 * 1024)
-                
-                status = {
-                    "status": "downloading",
-                    "percent": percent,
-                    "downloaded_mb": round(mb_downloaded, 1),
-                    "total_mb": round(mb_total, 1)
-                }
-                
-                try:
-                    with open("/tmp/file_download_progress.json", "w") as f:
-                        json.dump(status, f)
-                        f.flush()
-                except:
-                    pass
+            write_progress_status(sum(self.counters), self.total_size)
+        
+        def progress_loop(self):
+            # Workers only bump the counter, progress hits the disk at most every 200ms
+            while not self.stop_progress.wait(0.2):
+                self.update_progress()
         
         def accelerated_download(self):
-            setup_socket_optimizations()
-            
-            if not self.get_file_size():
+            try:
+                self.total_size, supports_ranges = probe_file(self.url, 'File Accelerator/1.0', 10)
+            except (URLError, HTTPError, OSError, ValueError, http.client.HTTPException):
+                return False
+            if self.total_size <= 0:
                 return False
             
+            self.num_connections = connections_for_size(self.total_size, self.num_connections)
             print(f"Accelerated download: {self.total_size / (1024*1024):.1f} MB with {self.num_connections} connections", file=sys.stderr)
             
-            if not self.test_range_support():
+            # Files under 16MB gain nothing from range windows on a single connection
+            if self.num_connections == 1:
+                print("Using single-threaded download", file=sys.stderr)
+                return single_threaded_download(self.url, self.target_file, write_progress_status, self.total_size)
+            
+            if not supports_ranges:
                 print("No range support, using single connection", file=sys.stderr)
                 return False
             
-            # Calculate chunks
-            chunk_size = self.total_size // self.num_connections
-            tasks = []
+            # Calculate windows
+            windows = split_windows(self.total_size)
+            
+            # Pre-size the file, connections write their ranges in place
+            try:
+                self.fd, completed = open_window_file(self.target_file, self.url, self.total_size)
+            except OSError as e:
+                print(f"File write error: {e}", file=sys.stderr)
+                return False
             
-            for i in range(self.num_connections):
-                start_byte = i * chunk_size
-                end_byte = start_byte + chunk_size - 1
-                if i == self.num_connections - 1:
-                    end_byte = self.total_size - 1
-                tasks.append((i, start_byte, end_byte))
+            self.counters = [end - start + 1 if i in completed else 0
+                             for i, (start, end) in enumerate(windows)]
             
             # Download in parallel
-            with ThreadPoolExecutor(max_workers=self.num_connections) as executor:
-                future_to_connection = {
-                    executor.submit(self.download_chunk, conn_id, start, end): conn_id
-                    for conn_id, start, end in tasks
-                }
-                
-                for future in as_completed(future_to_connection):
-                    conn_id, start_byte, data = future.result()
-                    
-                    if data is not None:
-                        self.chunks[conn_id] = (start_byte, data)
-                        print(f"Connection {conn_id} done: {len(data)} bytes", file=sys.stderr)
-                    else:
-                        print(f"Connection {conn_id} failed", file=sys.stderr)
-                        return False
+            progress_thread = threading.Thread(target=self.progress_loop, daemon=True)
+            progress_thread.start()
+            try:
+                # closing() stops the workers even when the loop body raises, before fd is closed
+                with contextlib.closing(download_windows(self.download_chunk, windows, self.num_connections, completed)) as results:
+                    for _ in results:
+                        save_window_state(self.target_file, self.url, self.total_size, completed)
+            except OSError as e:
+                print(f"Accelerated download failed: {e}", file=sys.stderr)
+                return False
+            finally:
+                self.stop_progress.set()
+                progress_thread.join()
+                drop_page_cache(self.fd)
+                os.close(self.fd)
             
-            # Write file
             try:
-                with open(self.target_file, 'wb') as f:
-                    for i in range(self.num_connections):
-                        if i in self.chunks:
-                            start_byte, data = self.chunks[i]
-                            f.write(data)
-                        else:
-                            return False
-                
-                # Final progress
-                self.downloaded = self.total_size
-                self.update_progress()
-                print("Accelerated download completed!", file=sys.stderr)
-                return True
-                
-            except Exception as e:
+                finish_window_file(self.target_file)
+            except OSError as e:
                 print(f"File write error: {e}", file=sys.stderr)
                 return False
+            
+            # Final progress
+            self.update_progress()
+            print("Accelerated download completed!", file=sys.stderr)
+            return True
     
     accelerator = DownloadAccelerator(url, target_file)
     return accelerator.accelerated_download()
 
+def open_progress_file():
+    """Open the UI progress file once per download, every status update reuses the fd"""
+    global _progress_fd, _progress_size
+    _progress_fd = os.open(PROGRESS_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    _progress_size = 0
+
+def close_progress_file():
+    global _progress_fd
+    if _progress_fd is not None:
+        os.close(_progress_fd)
+        _progress_fd = None
+
+def write_progress(payload):
+    """Overwrite the progress file in place with a single pwrite"""
+    global _progress_size
+    try:
+        if _progress_fd is None:
+            open_progress_file()
+        # Pad to the previous length instead of truncating, so the UI never reads a stale tail
+        data = payload.encode().ljust(_progress_size)
+        os.pwrite(_progress_fd, data, 0)
+        _progress_size = len(data)
+    except OSError as e:
+        print(f"Progress write error: {e}", file=sys.stderr)
+        pass  # Don't fail download if progress file can't be written
+
 def write_progress_status(downloaded, total_size):
     """Optimized progress writer with reduced frequency"""
     if total_size > 0:
@@ -410,24 +612,8 @@ def write_progress_status(downloaded, total_size):
         mb_downloaded = downloaded / (1024 * 1024)
         mb_total = total_size / (1024 * 1024)
         
-        status = {
-            "status": "downloading",
-            "percent": percent,
-            "downloaded_mb": round(mb_downloaded, 1),
-            "total_mb": round(mb_total, 1)
-        }
-        
-        # Debug output to stderr for troubleshooting
-        print(f"Progress: {percent}% ({mb_downloaded:.1f}/{mb_total:.1f} MB)", file=sys.stderr)
-        
-        # Write progress to file for UI to read
-        try:
-            with open("/tmp/file_download_progress.json", "w") as f:
-                json.dump(status, f)
-                f.flush()  # Ensure data is written immediately
-        except OSError as e:
-            print(f"Progress write error: {e}", file=sys.stderr)
-            pass  # Don't fail download if progress file can't be written
+        # Only four numbers change, so format directly instead of going through json.dump
+        write_progress(PROGRESS_FORMAT.format(percent, mb_downloaded, mb_total))
 
 def download_file(platform_name, file_filename):
     """Download file to appropriate platform folder with proper URL handling"""
@@ -436,8 +622,6 @@ def download_file(platform_name, file_filename):
     
     try:
         # Handle URL encoding properly
-        base_url = PLATFORM_URLS[platform_name]
-        
         # If file_filename is already URL-encoded, use it as-is
         # If not, encode it properly
         if '%' in file_filename:
@@ -449,40 +633,8 @@ def download_file(platform_name, file_filename):
             encoded_filename = urllib.parse.quote(file_filename)
             clean_filename_for_save = file_filename
         
-        # Construct download URL - handle GitHub repositories specially
-        if 'github.com' in base_url:
-            if '/tree/' in base_url:
-                # GitHub folder/tree URL
-                # From: https://github.com/user/repo/tree/main/pico-8
-                # To: https://raw.githubusercontent.com/user/repo/main/pico-8/
-                raw_base = base_url.replace('github.com', 'raw.githubusercontent.com')
-                raw_base = raw_base.replace('/tree/', '/')
-                if not raw_base.endswith('/'):
-                    raw_base += '/'
-                # file_filename contains full path like "pico-8/romnix.p8.png"
-                # Extract just the filename for the URL
-                filename_only = file_filename.split('/')[-1]
-                file_url = raw_base + filename_only
-            elif '/blob/' in base_url:
-                # GitHub blob URL - single file
-                # From: https://github.com/user/repo/blob/main/pico-8/file.png
-                # To: https://raw.githubusercontent.com/user/repo/main/pico-8/file.png
-                raw_base = base_url.replace('github.com', 'raw.githubusercontent.com')
-                raw_base = raw_base.replace('/blob/', '/')
-                file_url = raw_base
-            else:
-                # Regular GitHub repo URL
-                raw_base = base_url.replace('github.com', 'raw.githubusercontent.com')
-                if not raw_base.endswith('/'):
-                    raw_base += '/'
-                if '/main/' not in raw_base and '/master/' not in raw_base:
-                    raw_base += 'main/'
-                file_url = raw_base + encoded_filename
-        else:
-            # For Myrient and other direct download sites
-            if not base_url.endswith('/'):
-                base_url += '/'
-            file_url = base_url + encoded_filename
+        # Download URL builder precomputed for this platform
+        file_url = RAW_URL_BUILDERS[platform_name](file_filename, encoded_filename)
         
         # Clean the filename for filesystem
         clean_filename_for_save = clean_filename(clean_filename_for_save)
@@ -502,16 +654,14 @@ def download_file(platform_name, file_filename):
         print(f"To: {target_file}", file=sys.stderr)
         
         # Initialize progress
-        with open("/tmp/file_download_progress.json", "w") as f:
-            json.dump({"status": "starting", "percent": 0}, f)
+        open_progress_file()
+        write_progress(json.dumps({"status": "starting", "percent": 0}))
         
         # Use optimized download with progress tracking and retry logic
         print(f"Starting maximum speed download...", file=sys.stderr)
         
         # Write initial downloading status
-        with open("/tmp/file_download_progress.json", "w") as f:
-            json.dump({"status": "downloading", "percent": 0, "downloaded_mb": 0.0, "total_mb": 0.0}, f)
-            f.flush()
+        write_progress(PROGRESS_FORMAT.format(0, 0.0, 0.0))
         
         # Try accelerated download first, then fallback to optimized download
         print("Attempting accelerated multi-connection download...", file=sys.stderr)
@@ -552,8 +702,7 @@ def download_file(platform_name, file_filename):
             }
             
             # Write final status
-            with open("/tmp/file_download_progress.json", "w") as f:
-                json.dump(result, f)
+            write_progress(json.dumps(result))
             
             return result
         else:
@@ -564,9 +713,10 @@ def download_file(platform_name, file_filename):
         print(f"Download error: {error_msg}", file=sys.stderr)
         
         error_result = {"error": f"Download failed: {error_msg}", "status": "error"}
-        with open("/tmp/file_download_progress.json", "w") as f:
-            json.dump(error_result, f)
+        write_progress(json.dumps(error_result))
         return error_result
+    finally:
+        close_progress_file()
 
 if __name__ == "__main__":
     if len(sys.argv) != 3:
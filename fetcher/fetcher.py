@@ -2,13 +2,32 @@
 """
 File Fetcher with Caching
 """
-import urllib.request
 import urllib.parse
+import gzip
 import re
 import sys
 import json
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+import http_pool
+
+# orjson parses listings several times faster when it is installed, stdlib json otherwise
+try:
+    import orjson
+    
+    def json_loads(data):
+        return orjson.loads(data)
+    
+    def json_dumps(data):
+        return orjson.dumps(data)
+except ImportError:
+    def json_loads(data):
+        return json.loads(data)
+    
+    def json_dumps(data):
+        return json.dumps(data).encode('utf-8')
 
 # Platform URLs Single Source of Truth
 # "FOLDER_NAME": "YOUR_LINK_GOES_HERE",
@@ -19,48 +38,102 @@ PLATFORM_URLS = {
 # GitHub raw URL converter - converts tree URLs to raw content URLs
 GITHUB_RAW_BASE = "https://raw.githubusercontent.com/amosjerbi/fetcher/main/"
 
+# GitHub tree pages carry the folder listing in this script tag
+EMBEDDED_DATA_MARKER = b'data-target="react-app.embeddedData">'
+
+# Links to downloadable files on plain directory listing pages
+FILE_LINK_PATTERN = re.compile(rb'href="([^"\s]*\.(?:zip|p8\.png|rom|bin|cue|iso|7z))"')
+
+# Extensions hidden from the names shown in the file list
+DISPLAY_SUFFIXES = ('.zip', '.p8.png')
+
 CACHE_DIR = "/tmp/file_cache"
 CACHE_EXPIRY = 3600  # 1 hour cache
 
+# In-process copy of recent results, (platform_name, max_files) -> (fetch time, result)
+_MEM_CACHE = {}
+
 def ensure_cache_dir():
     """Create cache directory if it doesn't exist"""
-    if not os.path.exists(CACHE_DIR):
-        os.makedirs(CACHE_DIR)
+    # exist_ok since fetch_all can race several platforms to create it
+    os.makedirs(CACHE_DIR, exist_ok=True)
 
-def get_cache_file(platform_name):
-    """Get cache file path for platform"""
+def get_cache_file(platform_name, max_files=None):
+    """Get cache file path for platform, a capped list is cached apart from the full one"""
     safe_name = platform_name.replace(" ", "_").replace("/", "_")
+    if max_files is not None:
+        safe_name += f".first{max_files}"
     return os.path.join(CACHE_DIR, f"{safe_name}.json")
 
 def is_cache_valid(cache_file):
-    """Check if cache file is valid and not expired"""
-    if not os.path.exists(cache_file):
-        return False
-    
-    # Check if cache is not too old
-    cache_time = os.path.getmtime(cache_file)
-    current_time = time.time()
+    """Return the cache file's mtime if it exists and has not expired, otherwise None"""
+    # One stat call covers both the existence and the age check
+    try:
+        cache_time = os.stat(cache_file).st_mtime
+    except FileNotFoundError:
+        return None
     
-    return (current_time - cache_time) < CACHE_EXPIRY
+    return cache_time if (time.time() - cache_time) < CACHE_EXPIRY else None
 
 def load_from_cache(cache_file):
-    """Load file list from cache"""
+    """Load file list from cache, returns (data, validators)"""
     try:
-        with open(cache_file, 'r') as f:
-            return json.load(f)
+        with open(cache_file, 'rb') as f:
+            data = json_loads(f.read())
+        return data, data.pop('validators', None)
     except:
-        return None
+        return None, None
 
-def save_to_cache(cache_file, data):
-    """Save file list to cache"""
+def save_to_cache(cache_file, data, validators=None):
+    """Save file list to cache, with the ETag/Last-Modified it was fetched with"""
+    if validators:
+        data = dict(data, validators=validators)
+    
+    # Write a temp file and rename it over the cache so a killed run never leaves half a file
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
     try:
-        with open(cache_file, 'w') as f:
-            json.dump(data, f)
+        with open(tmp_file, 'wb') as f:
+            f.write(json_dumps(data))
+        os.replace(tmp_file, cache_file)
     except:
-        pass
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+
+def display_name(filename):
+    """Clean up a file name for display"""
+    # Most names have no escapes, skip the unquote call for those
+    name = urllib.parse.unquote(filename) if '%' in filename else filename
+    for suffix in DISPLAY_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+def github_file_entry(name, path):
+    """File list entry for a GitHub file, path is the full path like pico-8/romnix.p8.png"""
+    # For GitHub, use full path as filename for download URL construction
+    return {
+        "name": display_name(name),
+        "filename": path,
+        "path": path
+    }
+
+def parse_github_contents(items, max_files=None):
+    """Build the file list from a GitHub contents API directory listing"""
+    if not isinstance(items, list):
+        raise ValueError("GitHub API did not return a directory listing")
+    
+    files = []
+    for item in items:
+        if item.get('type') == 'file':
+            files.append(github_file_entry(item.get('name', ''), item.get('path', '')))
+            if max_files is not None and len(files) >= max_files:
+                break
+    return files
 
-def simple_html_parse(html_content, max_files=999, url=None):
-    """Complete HTML parsing - get ALL files"""
+def simple_html_parse(html_content, max_files=None, url=None):
+    """HTML parsing - get up to max_files files (all if None), html_content is the raw page bytes"""
     files = []
     
     # Check if this is a GitHub tree (folder) URL
@@ -69,43 +142,28 @@ def simple_html_parse(html_content, max_files=999, url=None):
     if is_github_tree:
         # GitHub embeds file list as JSON in a script tag
         # Look for: <script type="application/json" data-target="react-app.embeddedData">
-        json_pattern = r'<script type="application/json" data-target="react-app\.embeddedData">([^<]+)</script>'
-        match = re.search(json_pattern, html_content)
+        # Plain substring scans instead of a regex over the whole page
+        start = html_content.find(EMBEDDED_DATA_MARKER)
+        end = html_content.find(b'</script>', start) if start != -1 else -1
         
-        if match:
+        if end != -1:
             try:
-                import json as json_module
-                data = json_module.loads(match.group(1))
+                data = json_loads(html_content[start + len(EMBEDDED_DATA_MARKER):end])
                 tree_items = data.get('payload', {}).get('tree', {}).get('items', [])
                 
                 for item in tree_items:
                     if item.get('contentType') == 'file':
-                        name = item.get('name', '')
-                        path = item.get('path', '')  # Full path like "pico-8/romnix.p8.png"
-                        
-                        # For GitHub, use full path as filename for download URL construction
-                        filename = path
-                        
-                        # Clean up the file name for display
-                        display_name = urllib.parse.unquote(name)
-                        if display_name.endswith('.zip'):
-                            display_name = display_name[:-4]
-                        elif display_name.endswith('.p8.png'):
-                            display_name = display_name[:-7]
-                        
-                        files.append({
-                            "name": display_name,
-                            "filename": filename,
-                            "path": path
-                        })
+                        files.append(github_file_entry(item.get('name', ''), item.get('path', '')))
+                        if max_files is not None and len(files) >= max_files:
+                            break
             except Exception as e:
                 print(f"Error parsing GitHub JSON: {e}", file=sys.stderr)
     else:
         # Standard pattern for other sites
-        file_pattern = r'href="([^"]*\.(?:zip|p8\.png|rom|bin|cue|iso|7z))"'
-        matches = re.findall(file_pattern, html_content)
-        
-        for match in matches:
+        # finditer so the page after the last wanted link is never scanned
+        for link in FILE_LINK_PATTERN.finditer(html_content):
+            # Only the matched link is decoded, never the whole page
+            match = link.group(1).decode('utf-8', errors='ignore')
             if match.startswith('../'):
                 continue
             
@@ -115,17 +173,13 @@ def simple_html_parse(html_content, max_files=999, url=None):
                 continue
             else:
                 filename = match
-                
-            display_name = urllib.parse.unquote(filename)
-            if display_name.endswith('.zip'):
-                display_name = display_name[:-4]
-            elif display_name.endswith('.p8.png'):
-                display_name = display_name[:-7]
             
             files.append({
-                "name": display_name,
+                "name": display_name(filename),
                 "filename": filename
             })
+            if max_files is not None and len(files) >= max_files:
+                break
     
     return files
 
@@ -145,17 +199,63 @@ def github_url_to_raw(url, filename):
         return raw_url
     return None
 
-def fetch_file_list(platform_name, max_files=999):
+def github_api_url(url):
+    """Convert a GitHub tree URL to its contents API URL"""
+    # https://github.com/user/repo/tree/main/pico-8
+    # -> https://api.github.com/repos/user/repo/contents/pico-8?ref=main
+    if 'github.com/' not in url or '/tree/' not in url:
+        return None
+    repo, tree = url.split('github.com/', 1)[1].split('/tree/', 1)
+    branch, _, path = tree.strip('/').partition('/')
+    return f"https://api.github.com/repos/{repo.strip('/')}/contents/{path}?ref={branch}"
+
+def fetch_url(url, headers=None):
+    """GET through the shared keep-alive pool, returns (response, body bytes)"""
+    request_headers = {
+        'User-Agent': 'File Downloader/1.0 (Fast Fetcher)',
+        'Accept-Encoding': 'gzip'  # Listing pages compress 5-10x
+    }
+    if headers:
+        request_headers.update(headers)
+    
+    response = http_pool.request('GET', url, headers=request_headers, timeout=15)  # Increased timeout for better reliability
+    try:
+        body = response.read()
+    finally:
+        http_pool.release(response)
+    
+    if body and response.headers.get('Content-Encoding', '').lower() == 'gzip':
+        body = gzip.decompress(body)
+    return response, body
+
+def conditional_headers(validators, url):
+    """If-None-Match/If-Modified-Since headers when url is what the cached list came from"""
+    headers = {}
+    if validators and validators.get('url') == url:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+def fetch_file_list(platform_name, max_files=None):
     """Fast file list fetching with caching"""
+    # Repeat calls in the same process skip the disk cache entirely
+    cache_key = (platform_name, max_files)
+    entry = _MEM_CACHE.get(cache_key)
+    if entry and time.time() - entry[0] < CACHE_EXPIRY:
+        return entry[1]
+    
     ensure_cache_dir()
-    cache_file = get_cache_file(platform_name)
+    cache_file = get_cache_file(platform_name, max_files)
     
-    # Try cache first
-    if is_cache_valid(cache_file):
+    # Try cache first, an expired copy still supplies the validators for a conditional refresh
+    cached_data, validators = load_from_cache(cache_file)
+    cache_time = is_cache_valid(cache_file) if cached_data else None
+    if cache_time is not None:
         print(f"Loading {platform_name} from cache...", file=sys.stderr)
-        cached_data = load_from_cache(cache_file)
-        if cached_data:
-            return cached_data
+        _MEM_CACHE[cache_key] = (cache_time, cached_data)
+        return cached_data
     
     if platform_name not in PLATFORM_URLS:
         return {"error": f"Platform {platform_name} not found"}
@@ -165,21 +265,45 @@ def fetch_file_list(platform_name, max_files=999):
     try:
         print(f"Fast-fetching {platform_name} files...", file=sys.stderr)
         
-        # Create request with optimized headers and timeout
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', 'File Downloader/1.0 (Fast Fetcher)')
-        req.add_header('Connection', 'keep-alive')
+        files = None
+        not_modified = False
         
-        response = urllib.request.urlopen(req, timeout=15)  # Increased timeout for better reliability
-        html = response.read().decode('utf-8', errors='ignore')
+        # GitHub folders: the contents API returns a small JSON listing instead of a full page
+        source_url = github_api_url(url)
+        if source_url:
+            try:
+                headers = {'Accept': 'application/vnd.github+json'}
+                headers.update(conditional_headers(validators, source_url))
+                response, body = fetch_url(source_url, headers)
+                if response.status == 304:
+                    not_modified = True
+                else:
+                    files = parse_github_contents(json_loads(body), max_files)
+            except Exception as e:
+                # Unauthenticated API calls are rate limited, the page itself still works
+                print(f"GitHub API unavailable ({e}), parsing page instead", file=sys.stderr)
         
-        # Fast HTML parsing - only get first 15 files
-        files = simple_html_parse(html, max_files, url)
+        if files is None and not not_modified:
+            source_url = url
+            response, body = fetch_url(url, conditional_headers(validators, url))
+            if response.status == 304:
+                not_modified = True
+            else:
+                # Fast HTML parsing - up to max_files files
+                files = simple_html_parse(body, max_files, url)
+        
+        # 304 Not Modified has no body, the expired cache is still current
+        if not_modified:
+            print(f"{platform_name} unchanged, reusing cache...", file=sys.stderr)
+            os.utime(cache_file, None)
+            _MEM_CACHE[cache_key] = (time.time(), cached_data)
+            return cached_data
         
         # Store the base URL for downloading
         result_base_url = url
         
-        print(f"Found {len(files)} files (showing first {max_files})", file=sys.stderr)
+        shown = "all files" if max_files is None else f"first {max_files} files"
+        print(f"Found {len(files)} files (showing {shown})", file=sys.stderr)
         
         result = {
             "platform": platform_name,
@@ -187,11 +311,16 @@ def fetch_file_list(platform_name, max_files=999):
             "files": files,
             "status": "success",
             "cached": False,
-            "note": f"Showing first {max_files} files for speed"
+            "note": "Showing all files" if max_files is None else f"Showing first {max_files} files for speed"
         }
         
         # Save to cache for next time
-        save_to_cache(cache_file, result)
+        save_to_cache(cache_file, result, {
+            "url": source_url,
+            "etag": response.getheader('ETag'),
+            "last_modified": response.getheader('Last-Modified')
+        })
+        _MEM_CACHE[cache_key] = (time.time(), result)
         
         return result
         
@@ -199,6 +328,17 @@ def fetch_file_list(platform_name, max_files=999):
         print(f"Error: {str(e)}", file=sys.stderr)
         return {"error": f"Failed to fetch files: {str(e)}", "status": "error"}
 
+def fetch_all(names=None, max_files=None):
+    """Fetch several platforms at once, returns {platform_name: result}"""
+    names = list(names or PLATFORM_URLS)
+    if not names:
+        return {}
+    
+    # Fetches are network bound, threads overlap them over the shared connection pool
+    with ThreadPoolExecutor(max_workers=min(8, len(names))) as executor:
+        results = executor.map(lambda name: fetch_file_list(name, max_files), names)
+        return dict(zip(names, results))
+
 if __name__ == "__main__":
     if len(sys.argv) != 2:
         print("Usage: python3 fetcher.py <platform_name>")
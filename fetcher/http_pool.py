@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Keep-alive HTTP connection pool shared by the fetcher and downloader
+"""
+import http.client
+import threading
+import urllib.parse
+from urllib.error import URLError, HTTPError
+
+USER_AGENT = 'File Downloader/1.0'
+MAX_REDIRECTS = 5
+DRAIN_LIMIT = 64 * 1024  # Leftover bodies up to 64KB are read out so the socket can be reused
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+class ConnectionPool:
+    """Reuse open connections per host instead of a new TCP+TLS handshake per request"""
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def get_connection(self, key, timeout, fresh=False):
+        """Take an idle connection for (scheme, host, port) or open a new one"""
+        if not fresh:
+            with self.lock:
+                idle = self.idle.get(key)
+                conn = idle.pop() if idle else None
+            if conn is not None:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=timeout), False
+        return http.client.HTTPConnection(host, port, timeout=timeout), False
+
+    def put_connection(self, key, conn):
+        """Park a connection for reuse, closing it if the pool is full"""
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def send(self, key, method, path, headers, timeout):
+        conn, reused = self.get_connection(key, timeout)
+        try:
+            conn.request(method, path, headers=headers)
+            response = conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            if not reused:
+                raise
+            # Server dropped the idle keep-alive socket, retry once on a new one
+            conn, _ = self.get_connection(key, timeout, fresh=True)
+            try:
+                conn.request(method, path, headers=headers)
+                response = conn.getresponse()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                raise
+
+        response.pool_key = key
+        response.pool_conn = conn
+        return response
+
+    def request(self, method, url, headers=None, timeout=30):
+        """Send a request and return the open response, following redirects"""
+        request_headers = {'User-Agent': USER_AGENT}
+        if headers:
+            request_headers.update(headers)
+
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            if parts.scheme not in ('http', 'https') or not parts.hostname:
+                raise URLError(f"Unsupported URL: {url}")
+
+            key = (parts.scheme, parts.hostname, parts.port)
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+
+            response = self.send(key, method, path, request_headers, timeout)
+
+            location = response.getheader('Location')
+            if response.status in REDIRECT_CODES and location:
+                self.release(response)
+                url = urllib.parse.urljoin(url, location)
+                if response.status == 303:
+                    method = 'GET'
+                continue
+
+            if response.status >= 400:
+                self.release(response)
+                raise HTTPError(url, response.status, response.reason, response.headers, None)
+
+            return response
+
+        # The last redirect was already released inside the loop
+        raise HTTPError(url, response.status, "Too many redirects", response.headers, None)
+
+    def release(self, response):
+        """Return the response's connection to the pool, or close it if it can't be reused"""
+        if not response.isclosed() and response.length is not None and response.length <= DRAIN_LIMIT:
+            try:
+                response.read()
+            except (http.client.HTTPException, OSError):
+                pass
+
+        # A body cut short by the server leaves length > 0 and the socket is dead
+        if response.isclosed() and not response.will_close and not response.length:
+            self.put_connection(response.pool_key, response.pool_conn)
+        else:
+            response.close()
+            response.pool_conn.close()
+
+_POOL = ConnectionPool()
+
+def request(method, url, headers=None, timeout=30):
+    """Send a request through the shared pool"""
+    return _POOL.request(method, url, headers, timeout)
+
+def release(response):
+    """Release a response obtained from request()"""
+    _POOL.release(response)